@@ -1,6 +1,24 @@
 import pandas as pd
+import numpy as np
 import logging
 
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
+
+def _idle_mask(speed: np.ndarray, rpm: np.ndarray) -> np.ndarray:
+    """Idle definition: Speed = 0, RPM > 0. numexpr fuses both compares and the AND into one pass."""
+    if ne is not None:
+        return ne.evaluate("(speed == 0) & (rpm > 0)")
+    return (speed == 0) & (rpm > 0)
+
 class FleetInsights:
     def __init__(self):
         pass
@@ -23,9 +41,10 @@ class FleetInsights:
             
         return max(0, score)
 
-    def generate_vehicle_insights(self, vehicle_id: str, df: pd.DataFrame) -> dict:
+    def _build_insights(self, vehicle_id: str, n_rows: int, idle_count: int,
+                        avg_voltage: float, overspeed_events: int) -> dict:
         """
-        Analyzes a specific vehicle's history to generate key business tags.
+        Turns a vehicle's aggregated counters into risk tags and a health score.
         """
         insights = {
             'vehicle_id': vehicle_id,
@@ -34,9 +53,7 @@ class FleetInsights:
         }
         
         # 1. Fuel Efficiency Analysis (High Idle Time)
-        # Definition: Speed = 0, RPM > 0
-        idle_data = df[(df['speed_kmph'] == 0) & (df['rpm'] > 0)]
-        idle_time_pct = len(idle_data) / len(df) if len(df) > 0 else 0
+        idle_time_pct = idle_count / n_rows if n_rows > 0 else 0
         
         if idle_time_pct > 0.15: # >15% time idling
             insights['risks'].append("High Fuel Waste")
@@ -44,14 +61,12 @@ class FleetInsights:
             insights['fuel_risk'] = True
 
         # 2. Battery Integrity Analysis (Voltage Drop Trend)
-        avg_voltage = df['battery_voltage'].mean()
         if avg_voltage < 12.8:
             insights['risks'].append("Battery Failure Imminent")
             insights['action_items'].append("Schedule battery replacement.")
             insights['battery_risk'] = True
 
         # 3. Safety Compliance (Overspeeding)
-        overspeed_events = len(df[df['speed_kmph'] > 120])
         if overspeed_events > 5:
             insights['risks'].append("Safety Compliance Violation")
             insights['action_items'].append("Flag for safety review.")
@@ -61,16 +76,96 @@ class FleetInsights:
         
         return insights
 
+    def generate_vehicle_insights(self, vehicle_id: str, df: pd.DataFrame) -> dict:
+        """
+        Analyzes a specific vehicle's history to generate key business tags.
+        """
+        # Pull raw arrays once; fused predicates avoid intermediate DataFrames
+        speed = df['speed_kmph'].to_numpy(copy=False)
+        rpm = df['rpm'].to_numpy(copy=False)
+        voltage = df['battery_voltage'].to_numpy(copy=False)
+        n_rows = len(speed)
+
+        idle_count = np.count_nonzero(_idle_mask(speed, rpm))
+        avg_voltage = np.nanmean(voltage) if n_rows > 0 else np.nan
+        overspeed_events = np.count_nonzero(speed > 120)
+
+        return self._build_insights(vehicle_id, n_rows, idle_count, avg_voltage, overspeed_events)
+
+    def _aggregate_pandas(self, df: pd.DataFrame) -> list:
+        """Single groupby pass over precomputed idle/overspeed flags."""
+        flags = pd.DataFrame({
+            'vehicle_id': df['vehicle_id'],
+            'idle': _idle_mask(df['speed_kmph'].to_numpy(), df['rpm'].to_numpy()),
+            'over': df['speed_kmph'] > 120,
+            'battery_voltage': df['battery_voltage'],
+        })
+        agg = flags.groupby('vehicle_id', sort=False, observed=True).agg(
+            n_rows=('idle', 'size'),
+            idle_count=('idle', 'sum'),
+            avg_voltage=('battery_voltage', 'mean'),
+            overspeed_events=('over', 'sum'),
+        )
+        return [
+            (row.Index, row.n_rows, row.idle_count, row.avg_voltage, row.overspeed_events)
+            for row in agg.itertuples()
+        ]
+
+    def _aggregate_polars(self, df: pd.DataFrame) -> list:
+        """Multi-threaded Polars group_by over only the columns we need."""
+        cols = ['vehicle_id', 'speed_kmph', 'rpm', 'battery_voltage']
+        agg = (
+            pl.from_pandas(df[cols])
+            .lazy()
+            .group_by('vehicle_id', maintain_order=True)
+            .agg([
+                pl.len().alias('n_rows'),
+                ((pl.col('speed_kmph') == 0) & (pl.col('rpm') > 0)).sum().alias('idle_count'),
+                pl.col('battery_voltage').mean().alias('avg_voltage'),
+                (pl.col('speed_kmph') > 120).sum().alias('overspeed_events'),
+            ])
+            .collect()
+        )
+        return agg.rows()
+
     def generate_fleet_summary(self, df: pd.DataFrame):
         """
         Aggregates insights across the entire fleet.
+        One grouped aggregation (Polars if installed, else pandas) replaces
+        the per-vehicle boolean scans; only the small result is iterated.
         """
-        unique_vehicles = df['vehicle_id'].unique()
+        if pl is not None:
+            rows = self._aggregate_polars(df)
+        else:
+            rows = self._aggregate_pandas(df)
+        
         fleet_report = []
+        for vid, n_rows, idle_count, avg_voltage, overspeed_events in rows:
+            insight = self._build_insights(vid, n_rows, idle_count, avg_voltage, overspeed_events)
+            fleet_report.append(insight)
+            
+        return fleet_report
+
+    def generate_fleet_summary_sql(self, db):
+        """
+        Same report as generate_fleet_summary, but the aggregation runs inside
+        DuckDB over the 'telemetry' view so the raw rows never reach pandas.
+        """
+        agg = db.execute_query("""
+            SELECT
+                vehicle_id,
+                COUNT(*) AS n_rows,
+                COUNT_IF(is_idle) AS idle_count,
+                AVG(battery_voltage) AS avg_voltage,
+                COUNT_IF(is_overspeed) AS overspeed_events
+            FROM telemetry
+            GROUP BY vehicle_id
+            ORDER BY vehicle_id
+        """)
         
-        for vid in unique_vehicles:
-            v_df = df[df['vehicle_id'] == vid]
-            insight = self.generate_vehicle_insights(vid, v_df)
+        fleet_report = []
+        for vid, n_rows, idle_count, avg_voltage, overspeed_events in agg.itertuples(index=False):
+            insight = self._build_insights(vid, n_rows, idle_count, avg_voltage, overspeed_events)
             fleet_report.append(insight)
             
         return fleet_report
@@ -1,36 +1,76 @@
 import pandas as pd
+import numpy as np
 from sklearn.ensemble import IsolationForest
 import joblib
+from joblib import parallel_backend
 import os
 import logging
 
 class AnomalyDetector:
-    def __init__(self, contamination=0.03):
-        self.model = IsolationForest(contamination=contamination, random_state=42)
+    def __init__(self, contamination=0.03, max_train_rows=200_000):
+        self.model = IsolationForest(contamination=contamination, random_state=42, n_jobs=-1)
         self.features = ['speed_kmph', 'rpm', 'fuel_rate', 'engine_temp']
+        self.max_train_rows = max_train_rows
+        self.is_trained = False
         
-    def train(self, df: pd.DataFrame):
+    def _feature_matrix(self, data) -> np.ndarray:
+        """
+        Extracts the model features as one C-contiguous float32 block, NaN filled with 0.
+        float32 is what the trees use internally, so sklearn does no further conversion.
+        Accepts a pandas DataFrame or a pyarrow Table.
+        """
+        X = np.empty((len(data), len(self.features)), dtype=np.float32)
+        for j, col in enumerate(self.features):
+            X[:, j] = data[col].to_numpy()
+        X[np.isnan(X)] = 0
+        return X
+        
+    def train(self, df):
         """
         Trains the Isolation Forest model on specific features.
         In production, this would be an offline process.
         """
         logging.info("Training Isolation Forest model...")
-        X = df[self.features].fillna(0)
-        self.model.fit(X)
+        X = self._feature_matrix(df)
+        if len(X) > self.max_train_rows:
+            # Each tree only sees max_samples (256) rows; on large data fit time is the full
+            # scoring pass that sets the contamination threshold, which a uniform sample estimates as well
+            idx = np.random.default_rng(42).choice(len(X), self.max_train_rows, replace=False)
+            X = X[idx]
+        with parallel_backend('threading', n_jobs=-1):
+            self.model.fit(X)
         self.is_trained = True
         
     def predict(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Returns the DataFrame with an 'is_anomaly' column (-1 for anomaly, 1 for normal).
         """
-        X = df[self.features].fillna(0)
-        predictions = self.model.predict(X)
+        X = self._feature_matrix(df)
+        # Tree scoring only runs in parallel under an explicit joblib backend (sklearn PR #28622)
+        with parallel_backend('threading', n_jobs=-1):
+            predictions = self.model.predict(X)
         
-        results = df.copy()
-        results['is_anomaly_ml'] = predictions
+        # Filter only anomalies for easier viewing; only those rows (~contamination) are copied
+        anomalies = df.loc[predictions == -1].copy()
+        anomalies['is_anomaly_ml'] = -1
+        
+        if not anomalies.empty:
+            logging.info(f"ML Detected {len(anomalies)} anomalies.")
+            
+        return anomalies
+
+    def predict_arrow(self, table) -> pd.DataFrame:
+        """
+        Same as predict, for a pyarrow Table (e.g. from DatabaseManager.fetch_features).
+        Only the anomalous rows are converted to pandas.
+        """
+        X = self._feature_matrix(table)
+        with parallel_backend('threading', n_jobs=-1):
+            predictions = self.model.predict(X)
         
-        # Filter only anomalies for easier viewing
-        anomalies = results[results['is_anomaly_ml'] == -1]
+        is_anomaly = predictions == -1
+        anomalies = table.filter(is_anomaly).to_pandas()
+        anomalies['is_anomaly_ml'] = -1
         
         if not anomalies.empty:
             logging.info(f"ML Detected {len(anomalies)} anomalies.")
@@ -1,17 +1,24 @@
 import streamlit as st
 import pandas as pd
-import duckdb
 import plotly.express as px
 import plotly.graph_objects as go
 import sys
 import os
 import time
+import hashlib
+import shutil
+import glob
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+MODEL_DIR = os.path.join(BASE_DIR, 'models')
+
 from database.db_manager import DatabaseManager
 from analytics.models import AnomalyDetector
 from analytics.insights import FleetInsights
+from utils.ai_summarizer import AISummarizer
 
 st.set_page_config(layout="wide", page_title="Motorq Telemetry Analytics")
 
@@ -78,7 +85,10 @@ def ensure_data_exists():
     DATA_VERSION = 2 
     version_file = os.path.join(data_dir, f'.version_{DATA_VERSION}')
     
-    data_exists = os.path.exists(data_dir) and any(f.endswith('.parquet') for f in os.listdir(data_dir))
+    # Only telemetry_*.parquet backs the view; quarantine files do not count as data
+    data_exists = os.path.exists(data_dir) and any(
+        f.startswith('telemetry_') and f.endswith('.parquet') for f in os.listdir(data_dir)
+    )
     version_match = os.path.exists(version_file)
     
     if not data_exists or not version_match:
@@ -93,7 +103,6 @@ def ensure_data_exists():
         
         try:
             # Clean old data if version mismatch
-            import shutil
             if os.path.exists(data_dir):
                 shutil.rmtree(data_dir) # Wipe old data
             
@@ -120,9 +129,55 @@ def ensure_data_exists():
 def get_insights_engine():
     return FleetInsights()
 
-@st.cache_resource
-def get_anomaly_detector():
-    return AnomalyDetector()
+def get_data_signature(data_dir=DATA_DIR) -> tuple:
+    """
+    Cheap fingerprint of the parquet files behind the telemetry view: (name, mtime, size)
+    for each telemetry_*.parquet. Quarantine files are not read by the view, so they are
+    left out and a new quarantine batch does not invalidate anything.
+    """
+    if not os.path.exists(data_dir):
+        return ()
+    return tuple(sorted(
+        (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+        for entry in os.scandir(data_dir)
+        if entry.name.startswith('telemetry_') and entry.name.endswith('.parquet')
+    ))
+
+@st.cache_data
+def get_vehicles(data_signature, _db) -> list:
+    """Vehicle list for the sidebar; the fleet is stable until the parquet files change."""
+    return _db.list_vehicles()
+
+@st.cache_data
+def get_fleet_report(data_signature, _db) -> list:
+    """
+    Per-vehicle risk report for the whole fleet, keyed on the data signature.
+    Reruns and drill-downs reuse it; it is only recomputed when the parquet files change.
+    """
+    return get_insights_engine().generate_fleet_summary_sql(_db)
+
+@st.cache_resource(max_entries=1)
+def get_fitted_detector(data_signature, _db):
+    """
+    Returns an Isolation Forest fitted on the current data.
+    Keyed on the data signature, so it is only refit when the parquet files change;
+    only the latest forest is kept in memory.
+    The fitted model is also persisted (one file, for the latest data), so a fresh
+    process can skip training.
+    """
+    sig_hash = hashlib.md5(repr(data_signature).encode()).hexdigest()[:12]
+    model_path = os.path.join(MODEL_DIR, f'iso_forest_{sig_hash}.pkl')
+    
+    detector = AnomalyDetector()
+    detector.load_model(model_path)
+    if not detector.is_trained:
+        detector.train(_db.fetch_features(detector.features))
+        detector.save_model(model_path)
+        # Models fitted on older data can never be hit again
+        for stale in glob.glob(os.path.join(MODEL_DIR, 'iso_forest_*.pkl')):
+            if stale != model_path:
+                os.remove(stale)
+    return detector
 
 def main():
     st.title("Vehicle Telemetry & Anomaly Platform")
@@ -135,13 +190,24 @@ def main():
     st.sidebar.header("Filter Options")
     
     try:
-        df = db.execute_query("SELECT * FROM telemetry")
+        # Fleet KPIs are computed in DuckDB; raw rows are only pulled per chart
+        kpi_df = db.execute_query("""
+            SELECT
+                COUNT(*) AS total_records,
+                AVG(speed_kmph) AS avg_speed,
+                COUNT_IF(is_idle) AS idle_count
+            FROM telemetry
+        """)
+        data_signature = get_data_signature()
+        vehicles = get_vehicles(data_signature, db)
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return
 
-    vehicles = df['vehicle_id'].unique()
-    selected_vehicle = st.sidebar.selectbox("Select Vehicle", ["All"] + list(vehicles))
+    avg_speed = kpi_df['avg_speed'][0]
+    idle_count = kpi_df['idle_count'][0]
+    fleet_report = get_fleet_report(data_signature, db)
+    selected_vehicle = st.sidebar.selectbox("Select Vehicle", ["All"] + vehicles)
     
     st.sidebar.markdown("---")
     st.sidebar.caption("Data shown is synthetic but statistically realistic.")
@@ -155,17 +221,20 @@ def main():
         
         col1, col2, col3, col4 = st.columns(4)
         col1.metric("Total Vehicles", len(vehicles))
-        col2.metric("Total Data Points", len(df))
-        
-        idle_df = db.execute_query("SELECT SUM(CASE WHEN speed_kmph=0 AND rpm>0 THEN 1 ELSE 0 END) as idle_count FROM telemetry")
-        col3.metric("Total Idle Events", idle_df['idle_count'][0])
-        
-        avg_speed = df['speed_kmph'].mean()
+        col2.metric("Total Data Points", int(kpi_df['total_records'][0]))
+        col3.metric("Total Idle Events", idle_count)
         col4.metric("Fleet Avg Speed", f"{avg_speed:.1f} km/h")
         
+        st.markdown("#### Fleet Risk Summary")
+        st.dataframe(pd.DataFrame([
+            {'vehicle_id': r['vehicle_id'], 'health_score': r['health_score'], 'risks': ', '.join(r['risks'])}
+            for r in fleet_report
+        ]))
+        
         # Visuals
         st.markdown("#### Real-time Speed Distribution")
-        fig_hist = px.histogram(df, x="speed_kmph", color="vehicle_id", nbins=50, title="Speed Distribution by Vehicle")
+        speed_df = db.execute_query("SELECT vehicle_id, speed_kmph FROM telemetry")
+        fig_hist = px.histogram(speed_df, x="speed_kmph", color="vehicle_id", nbins=50, title="Speed Distribution by Vehicle")
         fig_hist.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white")
         st.plotly_chart(fig_hist, use_container_width=True)
 
@@ -175,7 +244,8 @@ def main():
         else:
             st.subheader(f"Deep Dive: {selected_vehicle}")
             
-            v_df = df[df['vehicle_id'] == selected_vehicle]
+            # Bucketed in DuckDB so Plotly ships a few hundred points, not the raw history
+            v_df = db.downsampled_series(selected_vehicle)
             
             fig_ts = go.Figure()
             fig_ts.add_trace(go.Scatter(x=v_df['timestamp'], y=v_df['speed_kmph'], name='Speed (km/h)'))
@@ -183,8 +253,7 @@ def main():
             fig_ts.update_layout(title="Speed vs RPM Correlated View", hovermode="x unified", paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white")
             st.plotly_chart(fig_ts, use_container_width=True)
             
-            insights_engine = get_insights_engine()
-            vehicle_risk = insights_engine.generate_vehicle_insights(selected_vehicle, v_df)
+            vehicle_risk = next(r for r in fleet_report if r['vehicle_id'] == selected_vehicle)
             
             st.markdown("#### Vehicle Risk Profile")
             col_r1, col_r2 = st.columns([1, 2])
@@ -204,9 +273,9 @@ def main():
     with tab3:
         st.subheader("Anomaly Detection (Isolation Forest)")
         
-        detector = get_anomaly_detector()
-        detector.train(df)
-        anomalies = detector.predict(df)
+        detector = get_fitted_detector(data_signature, db)
+        # Only the identifiers and model features are read; the rest of each row stays on disk
+        anomalies = detector.predict_arrow(db.fetch_features(['vehicle_id', 'timestamp'] + detector.features))
         
         st.warning(f"Detected {len(anomalies)} anomalies across the fleet.")
         
@@ -224,22 +293,21 @@ def main():
         
         
         if st.button("Generate Insight"):
-            from utils.ai_summarizer import AISummarizer
-            
             # Gather Real Metrics for the AI
             metrics = {
                 'total_vehicles': len(vehicles),
                 'avg_speed': avg_speed,
-                'idle_events': idle_df['idle_count'][0]
+                'idle_events': idle_count
             }
             top_anomalies = anomalies['vehicle_id'].unique().tolist() if not anomalies.empty else []
             
+            st.markdown("### Assistant Report")
+            # The request only starts when the stream is consumed, so the spinner wraps the
+            # rendering; tokens show up as they arrive instead of after the whole completion
             with st.spinner("Analyzing fleet telemetry with Groq (Llama3)..."):
                 summarizer = AISummarizer(api_key=GROQ_API_KEY)
                 summary = summarizer.generate_summary(metrics, top_anomalies)
-                
-            st.markdown("### Assistant Report")
-            st.markdown(summary)
+                st.write_stream(summary)
             
             if not GROQ_API_KEY:
                 st.warning("Please provide a valid Groq API Key.")
@@ -1,5 +1,8 @@
 import duckdb
+import pyarrow as pa
 import os
+import glob
+import math
 import logging
 
 class DatabaseManager:
@@ -8,8 +11,9 @@ class DatabaseManager:
         self._setup()
 
     def _setup(self):
-        """Initial setup."""
-        pass
+        """Initial setup: scan Parquet on every core and cache footers across queries."""
+        self.con.execute(f"PRAGMA threads={os.cpu_count() or 1}")
+        self.con.execute("SET parquet_metadata_cache=true")
 
     def load_data(self, data_dir='../../data'):
         """
@@ -22,18 +26,26 @@ class DatabaseManager:
                 os.makedirs(data_dir)
                 return
 
-            parquet_files = [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith('.parquet')]
-            if not parquet_files:
-                logging.warning("No parquet files found to load.")
-                return
-            
             # DuckDB generic glob pattern for loading multiple files
             # escaping backslashes for Windows if needed, but simple forward slash works in duckdb usually
             glob_pattern = os.path.join(data_dir, "telemetry_*.parquet")
             
+            # Same pattern as the view: quarantine_*.parquet files alone cannot back it
+            if not glob.glob(glob_pattern):
+                logging.warning("No parquet files found to load.")
+                return
+            
+            # Idle / overspeed flags are defined once here and reused by every query.
+            # vehicle_id stays VARCHAR: the view globs files written after it was created,
+            # so a fixed ENUM of today's ids would reject new vehicles. It is made categorical
+            # per result instead (execute_query / execute_arrow).
             query = f"""
             CREATE OR REPLACE VIEW telemetry AS 
-            SELECT * FROM read_parquet('{glob_pattern}');
+            SELECT
+                *,
+                (speed_kmph = 0 AND rpm > 0) AS is_idle,
+                (speed_kmph > 120) AS is_overspeed
+            FROM read_parquet('{glob_pattern}');
             """
             self.con.execute(query)
             logging.info("Data loaded into 'telemetry' view.")
@@ -42,10 +54,64 @@ class DatabaseManager:
             logging.error(f"Failed to load data: {e}")
             raise e
 
-    def execute_query(self, query: str):
-        """Executes a raw SQL query and returns a Pandas DataFrame."""
-        return self.con.execute(query).df()
+    def execute_query(self, query: str, params: list = None):
+        """
+        Executes a raw SQL query (optionally parameterized) and returns a Pandas DataFrame.
+        A vehicle_id column comes back as Categorical (a few ids repeated over many rows).
+        """
+        df = self.con.execute(query, params).df()
+        if 'vehicle_id' in df.columns:
+            df['vehicle_id'] = df['vehicle_id'].astype('category')
+        return df
+
+    def execute_arrow(self, query: str, params: list = None):
+        """
+        Executes a raw SQL query and returns a pyarrow Table (no pandas conversion).
+        A vehicle_id column is dictionary-encoded, so it converts to a pandas Categorical.
+        """
+        result = self.con.execute(query, params).arrow()
+        # DuckDB >= 1.5 returns a RecordBatchReader here; older versions return a Table
+        table = result.read_all() if hasattr(result, 'read_all') else result
+        idx = table.schema.get_field_index('vehicle_id')
+        if idx >= 0 and not pa.types.is_dictionary(table.schema.field(idx).type):
+            table = table.set_column(idx, 'vehicle_id', table.column(idx).dictionary_encode())
+        return table
+
+    def fetch_features(self, columns: list):
+        """
+        Projects only the requested columns of the telemetry view as a pyarrow Table.
+        DuckDB reads just those Parquet columns and hands them over without a pandas copy.
+        """
+        return self.execute_arrow(f"SELECT {', '.join(columns)} FROM telemetry")
     
+    def downsampled_series(self, vehicle_id: str, bucket_seconds: int = None, max_points: int = 500):
+        """
+        Returns a vehicle's speed and RPM averaged into fixed time buckets, ordered by time.
+        Without an explicit bucket_seconds, the bucket is sized from the vehicle's time span
+        so that at most ~max_points rows come back (1 Hz data stays at full resolution when short).
+        """
+        if bucket_seconds is None:
+            span = self.con.execute(
+                "SELECT epoch(MAX(timestamp)) - epoch(MIN(timestamp)) FROM telemetry WHERE vehicle_id = ?",
+                [vehicle_id]
+            ).fetchone()[0]
+            bucket_seconds = max(1, math.ceil((span or 0) / max_points))
+            
+        return self.execute_query("""
+            SELECT
+                time_bucket(to_seconds(?), timestamp) AS timestamp,
+                AVG(speed_kmph) AS speed_kmph,
+                AVG(rpm) AS rpm
+            FROM telemetry
+            WHERE vehicle_id = ?
+            GROUP BY 1
+            ORDER BY 1
+        """, [bucket_seconds, vehicle_id])
+
+    def list_vehicles(self) -> list:
+        """Returns the sorted distinct vehicle ids as a Python list."""
+        return [row[0] for row in self.con.execute("SELECT DISTINCT vehicle_id FROM telemetry ORDER BY vehicle_id").fetchall()]
+
     def get_summary(self):
          return self.execute_query("SELECT COUNT(*) as total_records, COUNT(DISTINCT vehicle_id) as vehicles FROM telemetry")
 
@@ -1,11 +1,14 @@
-import pandas as pd
+import pyarrow as pa
+import glob
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
 # Fix path to import generator
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from ingestion.generator import TelemetryGenerator
+from ingestion.storage import to_storage_types, open_parquet_writer
 
 # Setup Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -14,26 +17,66 @@ DATA_DIR = os.path.join(BASE_DIR, 'data')
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
-def generate_million_rows():
+def _init_worker():
+    """
+    The pool already runs one process per core, so a worker must not also start a
+    per-core Numba thread pool. Set before Numba is imported (the generator imports it lazily).
+    """
+    os.environ['NUMBA_NUM_THREADS'] = '1'
+
+def _gen_chunk(vehicle_ids: list, vehicle_profiles: dict,
+               start_time: datetime, num_steps: int, seed: int) -> pa.Table:
+    """
+    Generates the full, uninterrupted history (num_steps seconds) of a group of vehicles
+    as one chunk in the shared storage types. Runs in a worker process, seeded per chunk.
+    """
+    gen = TelemetryGenerator(vehicle_ids, seed=seed, vehicle_profiles=vehicle_profiles)
+    return to_storage_types(gen.generate_table(start_time, num_steps * len(vehicle_ids)))
+
+def generate_million_rows(base_seed: int = 42):
     print("🚀 Starting Large Scale Data Generation (Target: 1,000,000 rows)...")
     
     # Simulate a larger fleet
     vehicle_ids = [f'V{i:03d}' for i in range(1, 101)] # 100 Vehicles
-    gen = TelemetryGenerator(vehicle_ids)
+    # Profiles are assigned once so every chunk simulates the same fleet
+    vehicle_profiles = TelemetryGenerator(vehicle_ids, seed=base_seed).vehicle_profiles
     
     chunk_size = 50000
     total_rows = 1000000
+    num_steps = total_rows // len(vehicle_ids)
+    # Chunks split the fleet, not the timeline: each vehicle is simulated start to end by
+    # one generator, so its state never resets partway through its history
+    vehicles_per_chunk = max(1, chunk_size // num_steps)
+    vehicle_groups = [vehicle_ids[i:i + vehicles_per_chunk] for i in range(0, len(vehicle_ids), vehicles_per_chunk)]
+    num_chunks = len(vehicle_groups)
     start_time = datetime.now()
     
-    for i in range(0, total_rows, chunk_size):
-        print(f"   Generating chunk {i // chunk_size + 1} / {total_rows // chunk_size}...")
-        df = gen.generate_batch(start_time, chunk_size)
-        
-        # Save each chunk as a separate parquet file (Simulates partitioning)
-        file_path = os.path.join(DATA_DIR, f"telemetry_large_part_{i // chunk_size}.parquet")
-        df.to_parquet(file_path, index=False)
+    # Drop output of the old one-file-per-chunk layout so rows are not counted twice
+    for stale in glob.glob(os.path.join(DATA_DIR, "telemetry_large_part_*.parquet")):
+        os.remove(stale)
+    
+    # One file, one row group per chunk: a single footer and shared schema for DuckDB to scan
+    file_path = os.path.join(DATA_DIR, "telemetry_large.parquet")
+    writer = None
+    
+    # Vehicles are independent, so fan the groups out across cores; the parent streams them to disk in order
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, num_chunks), initializer=_init_worker) as pool:
+        futures = [
+            pool.submit(_gen_chunk, group, vehicle_profiles, start_time, num_steps, base_seed + i + 1)
+            for i, group in enumerate(vehicle_groups)
+        ]
+        try:
+            for done, future in enumerate(futures, start=1):
+                table = future.result()
+                if writer is None:
+                    writer = open_parquet_writer(file_path, table.schema)
+                writer.write_table(table, row_group_size=chunk_size)
+                print(f"   Generated chunk {done} / {num_chunks}...")
+        finally:
+            if writer is not None:
+                writer.close()
         
-    print(f"✅ Generated {total_rows} rows in {len(os.listdir(DATA_DIR))} files.")
+    print(f"✅ Generated {total_rows} rows in {num_chunks} row groups.")
     print(f"📂 Data stored in: {DATA_DIR}")
 
 if __name__ == "__main__":
@@ -1,143 +1,268 @@
 import pandas as pd
 import numpy as np
-import random
+import pyarrow as pa
 import time
-from datetime import datetime, timedelta
+import importlib.util
+from datetime import datetime
+
+# Numba is only imported when a batch is large enough to use the compiled kernel:
+# the import plus JIT compile cost ~1.5 s, far more than a small batch takes in NumPy
+HAS_NUMBA = importlib.util.find_spec('numba') is not None
+
+# Batches with at least this many (step, vehicle) cells run the clipped recurrences in
+# the compiled kernel; smaller ones use the vectorized NumPy loop
+NUMBA_MIN_CELLS = 1_000_000
+
+try:
+    import numexpr as ne
+    HAS_NUMEXPR = True
+except ImportError:
+    HAS_NUMEXPR = False
+
+
+_evolve_kernel = None
+
+def _compiled_evolve_clipped():
+    """
+    Compiles (on first call) and returns the Numba kernel for the clipped recurrences.
+    No on-disk cache: this module is imported both as 'generator' and 'ingestion.generator',
+    and a cache entry written under one name fails to load under the other.
+    """
+    global _evolve_kernel
+    if _evolve_kernel is None:
+        from numba import njit, prange
+        
+        def _evolve_clipped(speed0, rpm0, temp0, accel, idle_jitter, high_idle, high_idle_rpm,
+                            rpm_noise, temp_rise, malfunctioning, speed_cap, rpm_ratio,
+                            speed, rpm, engine_temp):
+            """
+            Scalar kernel for the clipped recurrences (speed, idle RPM, engine temp).
+            Vehicles are independent, so the vehicle axis runs in parallel; outputs are
+            written into the preallocated (T, V) arrays.
+            """
+            num_steps, num_vehicles = accel.shape
+            for v in prange(num_vehicles):
+                cur_speed = speed0[v]
+                cur_rpm = rpm0[v]
+                cur_temp = temp0[v]
+                for t in range(num_steps):
+                    cur_speed = min(max(cur_speed + accel[t, v], 0.0), speed_cap[v])
+                    
+                    if cur_speed == 0:
+                        if high_idle[t, v]:
+                            cur_rpm = high_idle_rpm[t, v]
+                        else:
+                            cur_rpm = min(max(cur_rpm + idle_jitter[t, v], 600.0), 1000.0)
+                    else:
+                        cur_rpm = cur_speed * rpm_ratio[v] + rpm_noise[t, v]
+                    
+                    if malfunctioning[v] or cur_speed > 0:
+                        cur_temp += temp_rise[t, v]
+                    else:
+                        cur_temp -= 0.1
+                    cur_temp = min(max(cur_temp, 20.0), 120.0)
+                    
+                    speed[t, v] = cur_speed
+                    rpm[t, v] = cur_rpm
+                    engine_temp[t, v] = cur_temp
+        
+        _evolve_kernel = njit(parallel=True)(_evolve_clipped)
+    return _evolve_kernel
 
 class TelemetryGenerator:
     """
     Generates synthetic vehicle telemetry data with realistic physics and controlled anomalies.
     """
-    def __init__(self, vehicle_ids: list):
+    def __init__(self, vehicle_ids: list, seed: int = None, vehicle_profiles: dict = None):
         self.vehicle_ids = vehicle_ids
         self.data_buffer = []
+        self.rng = np.random.default_rng(seed)
+        
+        if vehicle_profiles is not None:
+            # Reuse an existing assignment (e.g. parallel workers simulating the same fleet)
+            self.vehicle_profiles = dict(vehicle_profiles)
+        else:
+            profiles = ['Normal', 'Aggressive', 'Eco', 'Malfunctioning']
+            self.vehicle_profiles = {vid: profiles[self.rng.integers(len(profiles))] for vid in vehicle_ids}
+            
+            if len(vehicle_ids) >= 4:
+                self.vehicle_profiles[vehicle_ids[0]] = 'Aggressive'
+                self.vehicle_profiles[vehicle_ids[1]] = 'Eco'
+                self.vehicle_profiles[vehicle_ids[2]] = 'Malfunctioning'
         
-        profiles = ['Normal', 'Aggressive', 'Eco', 'Malfunctioning']
-        self.vehicle_profiles = {vid: random.choice(profiles) for vid in vehicle_ids}
+        # Profile parameters as (V,) arrays so a timestep updates the whole fleet at once
+        profile_arr = np.array([self.vehicle_profiles[vid] for vid in vehicle_ids])
+        aggressive = profile_arr == 'Aggressive'
+        eco = profile_arr == 'Eco'
+        self.malfunctioning = profile_arr == 'Malfunctioning'
         
-        if len(vehicle_ids) >= 4:
-            self.vehicle_profiles[vehicle_ids[0]] = 'Aggressive'
-            self.vehicle_profiles[vehicle_ids[1]] = 'Eco'
-            self.vehicle_profiles[vehicle_ids[2]] = 'Malfunctioning'
+        self.accel_bias = np.where(aggressive, 0.5, np.where(eco, -0.1, 0.0)) # Aggressive accelerates, Eco coasts
+        self.accel_variance = np.where(aggressive, 4.0, np.where(eco, 1.0, 2.0)) # Jerky vs smooth driving
+        self.speed_cap = np.where(eco, 120.0, 220.0)
+        self.rpm_ratio = np.where(aggressive, 40.0, 30.0)
+        self.fuel_factor = np.where(aggressive, 2.2, 1.5)
         
+        n = len(vehicle_ids)
         self.state = {
-            vid: {
-                'speed': 0.0,
-                'rpm': 800.0,
-                'engine_temp': 70.0,
-                'fuel_rate': 2.0,
-                'battery_voltage': 13.5,
-                'lat': 37.7749,
-                'lon': -122.4194,
-                'odometer': 10000.0
-            }
-            for vid in vehicle_ids
+            'speed': np.zeros(n),
+            'rpm': np.full(n, 800.0),
+            'engine_temp': np.full(n, 70.0),
+            'fuel_rate': np.full(n, 2.0),
+            'battery_voltage': np.full(n, 13.5),
+            'lat': np.full(n, 37.7749),
+            'lon': np.full(n, -122.4194),
+            'odometer': np.full(n, 10000.0)
         }
 
-    def _update_state(self, vid: str):
-        """Evolve the state of the vehicle using random walk logic, biased by profile."""
-        s = self.state[vid]
-        profile = self.vehicle_profiles[vid]
-        
-        accel_bias = 0
-        speed_cap = 220
-        rpm_noise = 100
-        
-        if profile == 'Aggressive':
-            accel_bias = 0.5 # Tends to accelerate
-            accel_variance = 4 # Jerky driving
-        elif profile == 'Eco':
-            accel_bias = -0.1 # Tends to coast
-            accel_variance = 1 # Smooth driving
-            speed_cap = 120
-        else:
-            accel_variance = 2
-            
+    def _update_state(self, num_steps: int) -> dict:
+        """
+        Evolve the fleet state for num_steps seconds using random walk logic, biased by profile.
+        All noise is drawn up front; only the clipped recurrences (speed, idle RPM, engine temp)
+        step through time: in a compiled kernel for large batches when Numba is available,
+        otherwise one vectorized step across vehicles at a time.
+        Returns a dict of (num_steps, V) arrays.
+        """
+        rng = self.rng
+        s = self.state
+        malf = self.malfunctioning
+        shape = (num_steps, len(self.vehicle_ids))
+        
         # Speed change (acceleration/deceleration)
-        accel = np.random.normal(accel_bias, accel_variance) 
-        s['speed'] = max(0, min(speed_cap, s['speed'] + accel))
-        
-        # RPM logic
-        if s['speed'] == 0:
-            if profile == 'Malfunctioning' and random.random() < 0.3:
-                s['rpm'] = np.random.normal(1500, 200) 
-            else:
-                s['rpm'] = max(600, min(1000, s['rpm'] + np.random.normal(0, 20)))
+        accel = rng.normal(self.accel_bias, self.accel_variance, size=shape)
+        
+        # RPM noise: idle jitter, malfunctioning high idle, driving noise
+        idle_jitter = rng.normal(0, 20, size=shape)
+        high_idle = malf & (rng.random(shape) < 0.3)
+        high_idle_rpm = rng.normal(1500, 200, size=shape)
+        rpm_noise = rng.normal(0, 100, size=shape)
+        
+        # Engine temp: malfunctioning overheats faster, moving warms up, idle cools down
+        temp_z = rng.standard_normal(shape)
+        temp_rise = np.where(malf, 0.2 + 0.1 * temp_z, 0.1 + 0.05 * temp_z)
+        
+        speed = np.empty(shape)
+        rpm = np.empty(shape)
+        engine_temp = np.empty(shape)
+        
+        if HAS_NUMBA and num_steps * len(self.vehicle_ids) >= NUMBA_MIN_CELLS:
+            kernel = _compiled_evolve_clipped()
+            kernel(s['speed'], s['rpm'], s['engine_temp'], accel, idle_jitter, high_idle, high_idle_rpm,
+                   rpm_noise, temp_rise, malf, self.speed_cap, self.rpm_ratio,
+                   speed, rpm, engine_temp)
         else:
-            ratio = 30 if profile != 'Aggressive' else 40
-            s['rpm'] = (s['speed'] * ratio) + np.random.normal(0, rpm_noise)
+            cur_speed, cur_rpm, cur_temp = s['speed'], s['rpm'], s['engine_temp']
             
-        if profile == 'Malfunctioning':
-            s['engine_temp'] += np.random.normal(0.2, 0.1) # Overheats faster
-        elif s['speed'] > 0:
-            s['engine_temp'] += np.random.normal(0.1, 0.05)
-        else:
-            s['engine_temp'] -= 0.1
-        s['engine_temp'] = max(20, min(120, s['engine_temp']))
-
-        factor = 1.5 if profile != 'Aggressive' else 2.2
-        s['fuel_rate'] = (s['rpm'] / 2000) * factor + np.random.normal(0, 0.1)
+            for t in range(num_steps):
+                cur_speed = np.clip(cur_speed + accel[t], 0, self.speed_cap)
+                stopped = cur_speed == 0
+                
+                idle_rpm = np.where(high_idle[t], high_idle_rpm[t], np.clip(cur_rpm + idle_jitter[t], 600, 1000))
+                cur_rpm = np.where(stopped, idle_rpm, cur_speed * self.rpm_ratio + rpm_noise[t])
+                
+                cur_temp = np.clip(cur_temp + np.where(malf | ~stopped, temp_rise[t], -0.1), 20, 120)
+                
+                speed[t] = cur_speed
+                rpm[t] = cur_rpm
+                engine_temp[t] = cur_temp
         
-        if profile == 'Malfunctioning' and random.random() < 0.1:
-             s['battery_voltage'] = 12.0 + np.random.normal(0, 0.5) # Alternator failing
+        # Memoryless signals are computed for all steps at once
+        fuel_noise = rng.normal(0, 0.1, size=shape)
+        fuel_factor = self.fuel_factor
+        if HAS_NUMEXPR:
+            fuel_rate = ne.evaluate("(rpm / 2000) * fuel_factor + fuel_noise")
         else:
-             s['battery_voltage'] = 13.5 + np.random.normal(0, 0.1)
+            fuel_rate = (rpm / 2000) * fuel_factor + fuel_noise
         
-        s['lat'] += np.random.normal(0, 0.0001)
-        s['lon'] += np.random.normal(0, 0.0001)
+        alternator_failing = malf & (rng.random(shape) < 0.1)
+        volt_z = rng.standard_normal(shape)
+        battery_voltage = np.where(alternator_failing, 12.0 + 0.5 * volt_z, 13.5 + 0.1 * volt_z)
         
-        self.state[vid] = s
-        return s
+        lat = s['lat'] + np.cumsum(rng.normal(0, 0.0001, size=shape), axis=0)
+        lon = s['lon'] + np.cumsum(rng.normal(0, 0.0001, size=shape), axis=0)
+        
+        steps = {
+            'speed': speed,
+            'rpm': rpm,
+            'engine_temp': engine_temp,
+            'fuel_rate': fuel_rate,
+            'battery_voltage': battery_voltage,
+            'lat': lat,
+            'lon': lon
+        }
+        if num_steps > 0:
+            for key, values in steps.items():
+                s[key] = values[-1].copy()
+        return steps
 
-    def _inject_anomaly(self, packet: dict):
+    def _inject_anomaly(self, columns: dict):
         """Randomly injects different types of anomalies for detection testing."""
-        roll = random.random()
+        rng = self.rng
+        roll = rng.random(len(columns['speed_kmph']))
         
-        if roll < 0.01:
-            packet['speed_kmph'] = -10 if random.random() < 0.5 else 300
-            
-        elif roll < 0.03:
-            packet['engine_temp'] = 115 + random.uniform(0, 10)
-            
-        elif roll < 0.05:
-            packet['battery_voltage'] = 11.5 - random.uniform(0, 2)
-            
-        elif roll < 0.08:
-            packet['speed_kmph'] = 0
-            packet['rpm'] = 2500 
-            packet['fuel_rate'] = 5.0
+        # One pass maps each roll to its anomaly type: [0, .01) [.01, .03) [.03, .05) [.05, .08), else none
+        bucket = np.searchsorted([0.01, 0.03, 0.05, 0.08], roll, side='right')
+        
+        impossible_speed = bucket == 0
+        columns['speed_kmph'][impossible_speed] = np.where(rng.random(impossible_speed.sum()) < 0.5, -10, 300)
+        
+        overheating = bucket == 1
+        columns['engine_temp'][overheating] = 115 + rng.uniform(0, 10, overheating.sum())
+        
+        voltage_drop = bucket == 2
+        columns['battery_voltage'][voltage_drop] = 11.5 - rng.uniform(0, 2, voltage_drop.sum())
+        
+        stationary_revving = bucket == 3
+        columns['speed_kmph'][stationary_revving] = 0
+        columns['rpm'][stationary_revving] = 2500
+        columns['fuel_rate'][stationary_revving] = 5.0
 
-        return packet
+        return columns
+
+    def _batch_columns(self, start_time: datetime, num_records: int) -> dict:
+        """
+        Simulates a batch straight into column arrays (one array per field).
+        Rows are ordered by timestamp, then vehicle, one row per vehicle per second;
+        vehicle_id holds integer codes into self.vehicle_ids.
+        """
+        num_vehicles = len(self.vehicle_ids)
+        num_steps = num_records // num_vehicles
+        steps = self._update_state(num_steps)
+        
+        timestamps = pd.Timestamp(start_time) + pd.to_timedelta(np.arange(num_steps), unit='s')
+        
+        # (T, V) -> flat row-major columns; vehicle_id only needs V distinct values,
+        # so it is stored as codes rather than one Python string per row
+        columns = {
+            'vehicle_id': np.tile(np.arange(num_vehicles, dtype=np.int32), num_steps),
+            'timestamp': timestamps.repeat(num_vehicles),
+            'speed_kmph': np.round(steps['speed'], 2).ravel(),
+            'rpm': steps['rpm'].astype(np.int64).ravel(),
+            'engine_temp': np.round(steps['engine_temp'], 1).ravel(),
+            'fuel_rate': np.round(steps['fuel_rate'], 2).ravel(),
+            'battery_voltage': np.round(steps['battery_voltage'], 2).ravel(),
+            'lat': steps['lat'].ravel(),
+            'lon': steps['lon'].ravel()
+        }
+        return self._inject_anomaly(columns)
 
     def generate_batch(self, start_time: datetime, num_records: int) -> pd.DataFrame:
         """
         Generates a batch of telemetry data.
+        Rows are ordered by timestamp, then vehicle, one row per vehicle per second.
         """
-        records = []
-        current_time = start_time
-        
-        for _ in range(num_records // len(self.vehicle_ids)):
-            for vid in self.vehicle_ids:
-                state = self._update_state(vid)
-                
-                packet = {
-                    'vehicle_id': vid,
-                    'timestamp': current_time,
-                    'speed_kmph': round(state['speed'], 2),
-                    'rpm': int(state['rpm']),
-                    'engine_temp': round(state['engine_temp'], 1),
-                    'fuel_rate': round(state['fuel_rate'], 2),
-                    'battery_voltage': round(state['battery_voltage'], 2),
-                    'lat': state['lat'],
-                    'lon': state['lon']
-                }
-                
-                packet = self._inject_anomaly(packet)
-                records.append(packet)
-            
-            current_time += timedelta(seconds=1)
-            
-        return pd.DataFrame(records)
+        columns = self._batch_columns(start_time, num_records)
+        columns['vehicle_id'] = pd.Categorical.from_codes(columns['vehicle_id'], categories=self.vehicle_ids)
+        return pd.DataFrame(columns, copy=False)
+
+    def generate_table(self, start_time: datetime, num_records: int) -> pa.Table:
+        """
+        Same batch as generate_batch, as a pyarrow Table built column by column
+        (vehicle_id as a dictionary column), for pipelines that stay in Arrow.
+        """
+        columns = self._batch_columns(start_time, num_records)
+        columns['vehicle_id'] = pa.DictionaryArray.from_arrays(columns['vehicle_id'], pa.array(self.vehicle_ids))
+        columns['timestamp'] = pa.array(columns['timestamp'])
+        return pa.table(columns)
 
 if __name__ == "__main__":
     gen = TelemetryGenerator(['V001', 'V002', 'V003'])
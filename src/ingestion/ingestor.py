@@ -1,8 +1,13 @@
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import logging
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
 from generator import TelemetryGenerator
+from storage import to_storage_types, open_parquet_writer
 
 # Setup Logging based on script location
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -18,61 +23,106 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+REJECTION_REASON = 'Schema/Physics Violation'
+
+def _invalid_mask(table: pa.Table):
+    """
+    Motorq-aligned rules as pyarrow.compute kernels over the column buffers: missing timestamp
+    or vehicle id, speed outside [0, 250], negative RPM. Returns a boolean mask, True = quarantine.
+    """
+    speed = table.column('speed_kmph')
+    rpm = table.column('rpm')
+    # Bounds as scalars of the column type, so narrow columns are not upcast for the compare
+    zero_speed, max_speed = pa.scalar(0, speed.type), pa.scalar(250, speed.type)
+    zero_rpm = pa.scalar(0, rpm.type)
+    invalid = pc.or_kleene(
+        pc.or_kleene(pc.is_null(table.column('timestamp')), pc.is_null(table.column('vehicle_id'))),
+        pc.or_kleene(pc.or_kleene(pc.less(speed, zero_speed), pc.greater(speed, max_speed)), pc.less(rpm, zero_rpm))
+    )
+    # A null reading is not a violation by itself (same as the NaN comparisons in pandas)
+    return pc.fill_null(invalid, False)
+
+def validate_table(table: pa.Table) -> tuple[pa.Table, pa.Table]:
+    """
+    Separates valid rows from invalid ones based on Motorq-aligned rules (see _invalid_mask);
+    the partitions are taken with Table.filter.
+    Returns (valid_table, invalid_table), the latter with a dictionary-encoded rejection_reason column.
+    """
+    invalid = _invalid_mask(table)
+    valid_table = table.filter(pc.invert(invalid))
+    invalid_table = table.filter(invalid)
+    invalid_table = invalid_table.append_column('rejection_reason', pa.DictionaryArray.from_arrays(
+        pa.array(np.zeros(invalid_table.num_rows, dtype=np.int8)), pa.array([REJECTION_REASON])
+    ))
+    return valid_table, invalid_table
+
 def validate_schema(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
     Separates valid data from invalid data based on Motorq-aligned rules.
+    The rules are evaluated by _invalid_mask on just the four columns they read; both
+    partitions are rows of df, so the caller's index is kept.
     Returns (valid_df, invalid_df)
     """
-    # 1. Check for Missing Timestamps or Vehicle IDs (Critical)
-    critical_errors = df[df['timestamp'].isnull() | df['vehicle_id'].isnull()]
-    
-    # 2. Check for Physics Violations (Speed < 0, Speed > 250, RPM < 0)
-    physics_errors = df[
-        (df['speed_kmph'] < 0) | 
-        (df['speed_kmph'] > 250) | 
-        (df['rpm'] < 0)
-    ]
-    
-    # Combine all invalid indices
-    invalid_indices = critical_errors.index.union(physics_errors.index)
-    
-    valid_df = df.drop(invalid_indices)
-    invalid_df = df.loc[invalid_indices].copy()
+    rule_columns = pa.Table.from_pandas(df[['timestamp', 'vehicle_id', 'speed_kmph', 'rpm']], preserve_index=False)
+    invalid = _invalid_mask(rule_columns).to_numpy(zero_copy_only=False)
+    if not isinstance(df['vehicle_id'].dtype, pd.CategoricalDtype):
+        df = df.assign(vehicle_id=df['vehicle_id'].astype('category'))
+    valid_df = df[~invalid]
+    invalid_df = df[invalid].copy()
     
     if not invalid_df.empty:
         # Add reason for rejection (simple mapping for demo)
-        invalid_df['rejection_reason'] = 'Schema/Physics Violation'
+        # Categorical, so Parquet stores it as a tiny dictionary instead of a repeated string
+        invalid_df['rejection_reason'] = pd.Categorical([REJECTION_REASON] * len(invalid_df))
         
     return valid_df, invalid_df
 
+def write_parquet(data, path: str, row_group_size: int = 256_000):
+    """
+    Writes a batch (DataFrame or pyarrow Table) through the shared storage writer settings
+    with large row groups, so DuckDB scans few, well-compressed chunks.
+    """
+    table = data if isinstance(data, pa.Table) else pa.Table.from_pandas(data, preserve_index=False)
+    with open_parquet_writer(path, table.schema) as writer:
+        writer.write_table(table, row_group_size=row_group_size)
+
 def run_ingestion_pipeline(num_records=1000):
     logging.info(f"Starting ingestion batch of {num_records} records...")
     
     # 1. Generate Data (Simulating Stream)
     gen = TelemetryGenerator(['V001', 'V002', 'V003', 'V004', 'V005'])
-    raw_df = gen.generate_batch(datetime.utcnow(), num_records)
+    # One clock read per batch: it is the (naive UTC) start of the simulated readings
+    # and the file suffix
+    batch_ns = time.time_ns()
+    # Built column by column as a pyarrow Table; the batch never goes through pandas
+    raw_table = to_storage_types(gen.generate_table(pd.Timestamp(batch_ns // 1000, unit='us'), num_records))
     
     # 2. Validation Layer
-    valid_df, invalid_df = validate_schema(raw_df)
+    valid_table, invalid_table = validate_table(raw_table)
     
     # 3. Storage (Simulating Bronze Layer)
     # Storing as Parquet for efficiency (better than CSV)
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
         
-    timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Epoch nanoseconds: sorts in ingest order, and batches in the same second no longer collide
+    valid_path = os.path.join(DATA_DIR, f'telemetry_valid_{batch_ns}.parquet')
+    invalid_path = os.path.join(DATA_DIR, f'quarantine_{batch_ns}.parquet')
+    
+    # Both sinks are in flight together; pyarrow releases the GIL while encoding and writing
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        valid_write = pool.submit(write_parquet, valid_table, valid_path) if valid_table.num_rows else None
+        invalid_write = pool.submit(write_parquet, invalid_table, invalid_path) if invalid_table.num_rows else None
     
-    if not valid_df.empty:
-        valid_path = os.path.join(DATA_DIR, f'telemetry_valid_{timestamp_str}.parquet')
-        valid_df.to_parquet(valid_path, index=False)
-        logging.info(f"Successfully ingested {len(valid_df)} records to {valid_path}")
-        print(f"✅ Ingested {len(valid_df)} records.")
+    if valid_write is not None:
+        valid_write.result()
+        logging.info(f"Successfully ingested {valid_table.num_rows} records to {valid_path}")
+        print(f"✅ Ingested {valid_table.num_rows} records.")
         
-    if not invalid_df.empty:
-        invalid_path = os.path.join(DATA_DIR, f'quarantine_{timestamp_str}.csv')
-        invalid_df.to_csv(invalid_path, index=False)
-        logging.warning(f"Quarantined {len(invalid_df)} records to {invalid_path}")
-        print(f"⚠️ Quarantined {len(invalid_df)} records (See logs).")
+    if invalid_write is not None:
+        invalid_write.result()
+        logging.warning(f"Quarantined {invalid_table.num_rows} records to {invalid_path}")
+        print(f"⚠️ Quarantined {invalid_table.num_rows} records (See logs).")
 
 if __name__ == "__main__":
     run_ingestion_pipeline(5000)
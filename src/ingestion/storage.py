@@ -0,0 +1,45 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Storage layout shared by every writer of telemetry_*.parquet. DuckDB takes the view's
+# column types from the first file it scans, so all files must agree on them.
+
+# vehicle_id has a handful of distinct values: stored as a Parquet dictionary column so
+# readers get integer codes (pandas category, DuckDB dictionary vector) instead of strings
+VEHICLE_ID_TYPE = pa.dictionary(pa.int16(), pa.string())
+
+# Storage widths: sensor readings never need FP64, RPM fits INT32. Halves the bytes
+# written, scanned and compared. Coordinates stay FP64 (FP32 is ~1 m at fleet latitudes).
+STORAGE_TYPES = {
+    'vehicle_id': VEHICLE_ID_TYPE,
+    'speed_kmph': pa.float32(),
+    'rpm': pa.int32(),
+    'engine_temp': pa.float32(),
+    'fuel_rate': pa.float32(),
+    'battery_voltage': pa.float32(),
+    'lat': pa.float64(),
+    'lon': pa.float64()
+}
+
+# Continuous, high-cardinality floats: BYTE_STREAM_SPLIT + zstd beats dictionary encoding.
+# The rounded sensor readings repeat a lot and compress better with the dictionary.
+BYTE_STREAM_SPLIT_COLUMNS = ('lat', 'lon')
+
+def to_storage_types(table: pa.Table) -> pa.Table:
+    """Casts the columns listed in STORAGE_TYPES to their storage type."""
+    for name, storage_type in STORAGE_TYPES.items():
+        idx = table.schema.get_field_index(name)
+        if idx >= 0 and table.schema.field(idx).type != storage_type:
+            table = table.set_column(idx, name, table.column(idx).cast(storage_type))
+    return table
+
+def open_parquet_writer(path: str, schema: pa.Schema) -> pq.ParquetWriter:
+    """
+    Opens a ParquetWriter with the shared encoding settings: zstd level 3, dictionary
+    encoding (BYTE_STREAM_SPLIT for coordinates), 1 MiB data pages.
+    """
+    split = [name for name in BYTE_STREAM_SPLIT_COLUMNS if name in schema.names]
+    dictionary = [name for name in schema.names if name not in split]
+    return pq.ParquetWriter(path, schema, compression='zstd', compression_level=3,
+                            use_dictionary=dictionary, use_byte_stream_split=split or False,
+                            data_page_size=1 << 20)
@@ -1,59 +1,127 @@
-import os
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, Iterator
+
+try:
+    from groq import Groq
+except ImportError:
+    Groq = None
+
+GROQ_MODEL = "llama-3.3-70b-versatile"
+
+@lru_cache(maxsize=4)
+def _groq_client(api_key: str):
+    """One Groq client per key, so its HTTP connection pool stays warm across summaries."""
+    if Groq is None:
+        raise ImportError("groq is not installed (pip install groq)")
+    return Groq(api_key=api_key)
+
+# Prompt skeletons are built once at import; each call only fills the fields via format_map
+_CONTEXT_TMPL = """
+        Fleet Status Report:
+        - Total Vehicles: {n}
+        - Average Fleet Speed: {spd:.1f} km/h
+        - Total Idle Events: {idle}
+        - Critical Anomalies Detected: {n_anomalies}
+        
+        Top Anomalous Vehicles:
+        {top5}
+        """.format_map
+
+_FALLBACK_TMPL = """
+            **Automated Analysis (No API Key Provided)**:
+            
+            The fleet is currently tracking **{n} vehicles**. 
+            Operations are mostly normal with an average speed of **{spd:.1f} km/h**.
+            
+            However, we have detected **{n_anomalies} critical anomalies** that require attention. 
+            Specifically, review the logs for **{top3}** as they are showing irregular patterns.
+            
+            *Tip: Enter an OpenAI API Key in the sidebar to get a deeper, AI-generated tactical analysis.*
+            """.format_map
+
+# Finished completions keyed by (api_key, prompt), least recently used evicted first
+_COMPLETIONS: OrderedDict = OrderedDict()
+_COMPLETIONS_MAX = 32
+
+def _stream_completion(api_key: str, prompt: str) -> Iterator[str]:
+    """
+    Yields the completion token by token as Groq streams it. Identical prompts (same fleet
+    metrics) are answered from memory in one piece; a completion is only cached once the
+    stream has finished.
+    """
+    key = (api_key, prompt)
+    if key in _COMPLETIONS:
+        _COMPLETIONS.move_to_end(key)
+        yield _COMPLETIONS[key]
+        return
+    
+    stream = _groq_client(api_key).chat.completions.create(
+        messages=[{"role": "user", "content": prompt}],
+        model=GROQ_MODEL,
+        stream=True,
+    )
+    parts = []
+    for chunk in stream:
+        token = chunk.choices[0].delta.content or ''
+        if token:
+            parts.append(token)
+            yield token
+    
+    _COMPLETIONS[key] = ''.join(parts)
+    if len(_COMPLETIONS) > _COMPLETIONS_MAX:
+        _COMPLETIONS.popitem(last=False)
 
 class AISummarizer:
     def __init__(self, api_key=None, provider="openai"):
         self.api_key = api_key
         self.provider = provider
+        # Build the client up front; a failure here is reported by generate_summary
+        self._client_error = None
+        if api_key:
+            try:
+                _groq_client(api_key)
+            except Exception as e:
+                self._client_error = e
 
-    def generate_summary(self, metrics: dict, anomalies: list) -> str:
+    def generate_summary(self, metrics: dict, anomalies: list) -> Iterable[str]:
         """
         Generates a summary using a real LLM (if key provided) or sophisticated rule-based templating.
+        Returns an iterable of text fragments: LLM tokens as they arrive, or the whole template at once.
         """
         
-        # 1. Construct the Context
-        context = f"""
-        Fleet Status Report:
-        - Total Vehicles: {metrics.get('total_vehicles')}
-        - Average Fleet Speed: {metrics.get('avg_speed', 0):.1f} km/h
-        - Total Idle Events: {metrics.get('idle_events')}
-        - Critical Anomalies Detected: {len(anomalies)}
+        # 1. Fields shared by the fallback report and the LLM context
+        fields = {
+            'n': metrics.get('total_vehicles'),
+            'spd': metrics.get('avg_speed', 0),
+            'idle': metrics.get('idle_events'),
+            'n_anomalies': len(anomalies),
+        }
         
-        Top Anomalous Vehicles:
-        {', '.join([str(a) for a in anomalies[:5]])}
-        """
-
         # 2. If no API Key, return a sophisticated template (Fallback)
         if not self.api_key:
-            return f"""
-            **Automated Analysis (No API Key Provided)**:
-            
-            The fleet is currently tracking **{metrics.get('total_vehicles')} vehicles**. 
-            Operations are mostly normal with an average speed of **{metrics.get('avg_speed', 0):.1f} km/h**.
-            
-            However, we have detected **{len(anomalies)} critical anomalies** that require attention. 
-            Specifically, review the logs for **{', '.join([str(a) for a in anomalies[:3]])}** as they are showing irregular patterns.
-            
-            *Tip: Enter an OpenAI API Key in the sidebar to get a deeper, AI-generated tactical analysis.*
-            """
-
-        # 3. If API Key exists, call the LLM (Using Groq)
-        try:
-            from groq import Groq
-            client = Groq(api_key=self.api_key)
-            
-            prompt = f"""
+            fields['top3'] = ', '.join(map(str, anomalies[:3]))
+            return [_FALLBACK_TMPL(fields)]
+        
+        # 3. If API Key exists, construct the Context and call the LLM (Using Groq)
+        fields['top5'] = ', '.join(map(str, anomalies[:5]))
+        context = _CONTEXT_TMPL(fields)
+        
+        prompt = f"""
             You are a Fleet Operations Manager assistant. Analyze the following telemetry data and provide a pithy, executive summary 
             highlighting risks (fuel, safety, maintenance). Be professional and concise.
             
             Data:
             {context}
             """
-            
-            response = client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.3-70b-versatile",
-            )
-            return response.choices[0].message.content
+        return self._stream_or_error(prompt)
+    
+    def _stream_or_error(self, prompt: str) -> Iterator[str]:
+        """Streams the LLM answer; a failure (even mid-stream) ends it with an error line instead of raising."""
+        try:
+            if self._client_error is not None:
+                raise self._client_error
+            yield from _stream_completion(self.api_key, prompt)
             
         except Exception as e:
-            return f"❌ AI Generation Failed: {str(e)}"
+            yield f"❌ AI Generation Failed: {str(e)}"